@@ -1,8 +1,18 @@
-import json
+import orjson
 import pandas as pd
 import re
 import os
 
+_JSON_FENCE = re.compile(r"```json(.*?)```", re.DOTALL)
+PORTFOLIO_DTYPES = {
+    "Holding Name": str,
+    "Buying Price": "float64",
+    "Current Price": "float64",
+    "Number of Units": "float64",
+    "Total Amount": "float64",
+    "Perct Change": "float64",
+}
+
 
 def extract_inner_json(data):
     """Extracts and returns the parsed inner JSON from a Gemini response."""
@@ -11,16 +21,23 @@ def extract_inner_json(data):
 
     text = data["text"].strip()
 
+    # Bare JSON needs no fence search; fall through to it only if parsing fails
+    if text.startswith("{"):
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+
     # Extract JSON between ```json ... ``` if present
-    match = re.search(r"```json(.*?)```", text, re.DOTALL)
+    match = _JSON_FENCE.search(text)
     if match:
         inner = match.group(1).strip()
-        return json.loads(inner)
+        return orjson.loads(inner)
 
     # Fallback: try direct JSON parsing
     if text.startswith("json\n"):
         text = text[5:].strip()
-    return json.loads(text)
+    return orjson.loads(text)
 
 
 def update_portfolio(input_date, output_date):
@@ -35,8 +52,8 @@ def update_portfolio(input_date, output_date):
         raise FileNotFoundError(f"CSV file not found: {csv_input_path}")
 
     # --- Load Gemini JSON ---
-    with open(json_path, "r", encoding="utf-8") as f:
-        outer_data = json.load(f)
+    with open(json_path, "rb") as f:
+        outer_data = orjson.loads(f.read())
 
     # Extract actual trading instructions
     inner_data = extract_inner_json(outer_data)
@@ -47,12 +64,24 @@ def update_portfolio(input_date, output_date):
     trades = inner_data["trades"]
 
     # --- Load portfolio CSV ---
-    df = pd.read_csv(csv_input_path)
-
-    # Extract and remove cash row
-    cash_row = df[df["Holding Name"].str.lower() == "cash"]
-    cash = float(cash_row["Total Amount"].values[0]) if not cash_row.empty else 0.0
-    df = df[df["Holding Name"].str.lower() != "cash"]
+    df = pd.read_csv(csv_input_path, usecols=list(PORTFOLIO_DTYPES), dtype=PORTFOLIO_DTYPES)
+
+    # Key holdings by name, keeping the first row per name; later duplicates
+    # are written back unchanged. The first cash row sets the cash balance.
+    records = {}
+    duplicate_rows = []
+    cash = None
+    for row in df.to_dict("records"):
+        holding = row.pop("Holding Name")
+        if isinstance(holding, str) and holding.lower() == "cash":
+            if cash is None:
+                cash = float(row["Total Amount"])
+        elif holding in records:
+            duplicate_rows.append({"Holding Name": holding, **row})
+        else:
+            records[holding] = row
+    if cash is None:
+        cash = 0.0
 
     # --- Process trades from Gemini ---
     for trade in trades:
@@ -64,71 +93,80 @@ def update_portfolio(input_date, output_date):
 
         if action == "remove":
             # Simply drop the stock from the portfolio
-            idx = df[df["Holding Name"] == symbol].index
-            if not idx.empty:
-                df = df.drop(idx[0])
+            records.pop(symbol, None)
             continue
 
+        rec = records.get(symbol)
+
         if action == "sell":
             # Add to cash, reduce or remove holding
             cash += amount
-            idx = df[df["Holding Name"] == symbol].index
-            if not idx.empty:
-                current_units = df.at[idx[0], "Number of Units"]
-                new_units = current_units - shares
+            if rec is not None:
+                new_units = rec["Number of Units"] - shares
                 if new_units > 0:
-                    df.at[idx[0], "Number of Units"] = new_units
-                    df.at[idx[0], "Current Price"] = price
-                    df.at[idx[0], "Total Amount"] = round(price * new_units, 2)
-                    buy_price = df.at[idx[0], "Buying Price"]
-                    df.at[idx[0], "Perct Change"] = round(((price - buy_price) / buy_price) * 100, 2)
+                    buy_price = rec["Buying Price"]
+                    rec["Number of Units"] = new_units
+                    rec["Current Price"] = price
+                    rec["Total Amount"] = price * new_units
+                    rec["Perct Change"] = ((price - buy_price) / buy_price) * 100
                 else:
-                    df = df.drop(idx[0])
+                    records.pop(symbol)
 
         elif action == "buy":
             # Subtract from cash, add or update holding
             cash -= amount
-            idx = df[df["Holding Name"] == symbol].index
-            if not idx.empty:
-                old_units = df.at[idx[0], "Number of Units"]
-                old_buy = df.at[idx[0], "Buying Price"]
-                old_cost = round(old_buy * old_units, 2)
+            if rec is not None:
+                old_units = rec["Number of Units"]
+                old_cost = round(rec["Buying Price"] * old_units, 2)
                 new_cost = amount
                 new_units = old_units + shares
                 new_buy = round((old_cost + new_cost) / new_units, 2)
-                df.at[idx[0], "Buying Price"] = new_buy
-                df.at[idx[0], "Current Price"] = price
-                df.at[idx[0], "Number of Units"] = new_units
-                df.at[idx[0], "Total Amount"] = round(price * new_units, 2)
-                df.at[idx[0], "Perct Change"] = round(((price - new_buy) / new_buy) * 100, 2)
+                rec["Buying Price"] = new_buy
+                rec["Current Price"] = price
+                rec["Number of Units"] = new_units
+                rec["Total Amount"] = price * new_units
+                rec["Perct Change"] = ((price - new_buy) / new_buy) * 100
             else:
-                new_row = {
-                    "Holding Name": symbol,
+                records[symbol] = {
                     "Buying Price": price,
                     "Current Price": price,
                     "Number of Units": shares,
                     "Total Amount": amount,
                     "Perct Change": 0.00,
                 }
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
 
     # --- Add updated cash row ---
     cash = round(cash, 2)
-    cash_row = pd.DataFrame({
-        "Holding Name": ["Cash"],
-        "Buying Price": [cash],
-        "Current Price": [cash],
-        "Number of Units": [1],
-        "Total Amount": [cash],
-        "Perct Change": [0.00],
-    })
-    df = pd.concat([df, cash_row], ignore_index=True)
-
-    # --- Round and save ---
-    for col in ["Buying Price", "Current Price", "Total Amount", "Perct Change"]:
-        df[col] = df[col].round(2)
-
-    df.to_csv(csv_output_path, index=False)
+    cash_row = {
+        "Holding Name": "Cash",
+        "Buying Price": cash,
+        "Current Price": cash,
+        "Number of Units": 1,
+        "Total Amount": cash,
+        "Perct Change": 0.00,
+    }
+
+    df = pd.DataFrame.from_records(
+        [{"Holding Name": holding, **rec} for holding, rec in records.items()] + duplicate_rows + [cash_row],
+        columns=list(PORTFOLIO_DTYPES),
+    )
+
+    # Units are written as whole numbers when they all are, and never through
+    # float_format, so fractional share counts keep their precision
+    units = df["Number of Units"].astype("float64")
+    if (units % 1 == 0).all():
+        df["Number of Units"] = units.astype("int64")
+    else:
+        df["Number of Units"] = units.astype(object)
+
+    # --- Save, formatting prices and percentages to 2 decimals ---
+    df.to_csv(
+        csv_output_path,
+        index=False,
+        columns=list(PORTFOLIO_DTYPES),
+        float_format="%.2f",
+        lineterminator="\n",
+    )
     print(f"✅ Portfolio successfully updated for {output_date}: {csv_output_path}")
 
 
@@ -1,12 +1,58 @@
+import asyncio
+import functools
+import hashlib
+import multiprocessing as mp
 import os
-import json
+import re
+import sys
+import tempfile
+import threading
+import orjson
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
-import google.generativeai as genai
-from read_portfolio import get_portfolio_string
-from read_stocks import get_stock_data_string
+from read_portfolio import get_portfolio_string as _read_portfolio_string
+from read_stocks import get_stock_data_string as _read_stock_data_string
 
-load_dotenv()
+SIGNALS_DIR = os.path.join("Gemini Daily Reviews", "Weekdays")
+RESPONSE_CACHE_DIR = os.path.join(".cache", "responses")
+_PLACEHOLDER = re.compile(r"\[(Portfolio String|Stock Data|Prior Signals JSON|Prior Week's Signals|Date)\]")
+
+
+class SingleFlightCache:
+    """Memoises a one-argument function; concurrent callers for the same key share a single call.
+
+    Failed calls are not cached, so the next caller for that key retries.
+    """
+
+    def __init__(self, func):
+        functools.update_wrapper(self, func)
+        self._func = func
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def __call__(self, key):
+        with self._lock:
+            future = self._futures.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._futures[key] = future
+
+        if is_owner:
+            # Run outside the lock so other keys are not blocked
+            try:
+                future.set_result(self._func(key))
+            except BaseException as e:
+                with self._lock:
+                    del self._futures[key]
+                future.set_exception(e)
+        return future.result()
+
+
+# Concurrent and batch runs ask for the same dates repeatedly; load each once per process
+get_portfolio_string = SingleFlightCache(_read_portfolio_string)
+get_stock_data_string = SingleFlightCache(_read_stock_data_string)
 
 
 def get_prompt_type():
@@ -22,7 +68,56 @@ def get_prompt_type():
         print("Invalid input. Please enter 'f', 'd', 't', or 'n'.")
 
 
-def load_prompt(prompt_type: str, date_input: str) -> str:
+@SingleFlightCache
+def _read_prompt(file_path: str) -> str:
+    """Reads a prompt template once per process; the templates are static."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Prompt file '{file_path}' not found.")
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def _read_signal(past_date: str, signal_file: str):
+    """Reads one daily signal file and returns its parsed inner JSON, or None if missing or malformed."""
+    try:
+        with open(signal_file, 'rb') as f:
+            signal_data = orjson.loads(f.read())
+        text = signal_data["text"].strip()
+        if text.startswith("```json"):
+            text = text[7:].rstrip("```").strip()
+        signal_content = orjson.loads(text)
+        signal_content["date"] = past_date
+        return signal_content
+    except FileNotFoundError:
+        return None
+    except orjson.JSONDecodeError as e:
+        print(f"Error parsing signal JSON for {past_date}: {e}")
+        return None
+
+
+def _load_prior_signals(signals_dir: str, dates: list) -> list:
+    """Loads and parses the daily signal files that exist for the given dates."""
+    signal_files = [os.path.join(signals_dir, f"d_{past_date}.json") for past_date in dates]
+    if not signal_files:
+        return []
+
+    # Just try to open each file: one syscall per date, independent of how many
+    # signals have accumulated. Reads are I/O-bound, so overlap them; map keeps date order
+    with ThreadPoolExecutor(max_workers=len(signal_files)) as ex:
+        results = ex.map(_read_signal, dates, signal_files)
+    return [signal_content for signal_content in results if signal_content is not None]
+
+
+def _stock_data_or_fallback(date_input: str) -> str:
+    """Returns the stock data string for a date, or a placeholder line if it cannot be loaded."""
+    try:
+        return get_stock_data_string(date_input)
+    except Exception as e:
+        print(f"Error loading stock data for {date_input}: {e}")
+        return f"No stock data available for {date_input}"
+
+
+def load_prompt(prompt_type: str, target_date: datetime) -> str:
     """Loads and processes prompt from file, substituting portfolio, stock data, and prior signals."""
     prompt_files = {
         'f': './Prompts/first_timer_prompt.txt',
@@ -30,133 +125,63 @@ def load_prompt(prompt_type: str, date_input: str) -> str:
         't': './Prompts/training_prompt.txt',
         'n': './Prompts/no_trading_day_prompt.txt'
     }
-    file_path = prompt_files.get(prompt_type)
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Prompt file '{file_path}' not found.")
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        prompt = f.read().strip()
+    prompt = _read_prompt(prompt_files.get(prompt_type))
+    date_input = target_date.strftime('%Y-%m-%d')
+    substitutions = {}
+    # Only load the data for placeholders this template actually uses
+    placeholders = set(_PLACEHOLDER.findall(prompt))
 
     # Add portfolio for daily, training, or no-trading-day prompts
-    if prompt_type in ['d', 't', 'n']:
+    if prompt_type in ['d', 't', 'n'] and "Portfolio String" in placeholders:
         try:
             portfolio_str = get_portfolio_string(date_input)
         except Exception as e:
             print(f"Error loading portfolio for {date_input}: {e}")
             portfolio_str = f"No portfolio data available for {date_input}"
-        prompt = prompt.replace("[Portfolio String]", portfolio_str)
-
-    try:
-        target_date = datetime.strptime(date_input, '%Y-%m-%d')
-
-        if prompt_type == 't':
-            # Include stock data for the past 5 days
-            stock_data = ""
-            for i in range(5):
-                past_date = (target_date - timedelta(days=i)).strftime('%Y-%m-%d')
-                try:
-                    stock_data += get_stock_data_string(past_date) + "\n"
-                except Exception as e:
-                    print(f"Error loading stock data for {past_date}: {e}")
-                    stock_data += f"No stock data available for {past_date}\n"
-            prompt = prompt.replace("[Stock Data]", stock_data)
-
-            # Include prior signals for the past 5 days
-            prior_signals = []
-            signals_dir = os.path.join("Gemini Daily Reviews", "Weekdays")
-            for i in range(5):
-                past_date = (target_date - timedelta(days=i)).strftime('%Y-%m-%d')
-                signal_file = os.path.join(signals_dir, f"d_{past_date}.json")
-                if os.path.exists(signal_file):
-                    try:
-                        with open(signal_file, 'r', encoding='utf-8') as f:
-                            signal_data = json.load(f)
-                            text = signal_data["text"].strip()
-                            if text.startswith("```json"):
-                                text = text[7:].rstrip("```").strip()
-                            signal_content = json.loads(text)
-                            signal_content["date"] = past_date
-                            prior_signals.append(signal_content)
-                    except json.JSONDecodeError as e:
-                        print(f"Error parsing signal JSON for {past_date}: {e}")
-            prompt = prompt.replace("[Prior Signals JSON]", json.dumps(prior_signals))
-            prompt = prompt.replace("[Date]", date_input)
-
-        elif prompt_type == 'n':
-            # For no-trading-day: no stock data, just prior signals
-            prior_signals = []
-            signals_dir = os.path.join("Gemini Daily Reviews", "Weekdays")
-            for i in range(5):
-                past_date = (target_date - timedelta(days=i)).strftime('%Y-%m-%d')
-                signal_file = os.path.join(signals_dir, f"d_{past_date}.json")
-                if os.path.exists(signal_file):
-                    try:
-                        with open(signal_file, 'r', encoding='utf-8') as f:
-                            signal_data = json.load(f)
-                            text = signal_data["text"].strip()
-                            if text.startswith("```json"):
-                                text = text[7:].rstrip("```").strip()
-                            signal_content = json.loads(text)
-                            signal_content["date"] = past_date
-                            prior_signals.append(signal_content)
-                    except json.JSONDecodeError as e:
-                        print(f"Error parsing signal JSON for {past_date}: {e}")
-            prompt = prompt.replace("[Prior Signals JSON]", json.dumps(prior_signals))
-            prompt = prompt.replace("[Date]", date_input)
-
-        else:
-            # Daily or first-time prompt
-            try:
-                stock_data = get_stock_data_string(date_input)
-            except Exception as e:
-                print(f"Error loading stock data for {date_input}: {e}")
-                stock_data = f"No stock data available for {date_input}"
-            prompt = prompt.replace("[Stock Data]", stock_data)
-
-            if prompt_type == 'd':
-                prior_signals = []
-                signals_dir = os.path.join("Gemini Daily Reviews", "Weekdays")
-
-                if target_date.weekday() == 0:
-                    # Monday: load prior Friday to Monday signals
-                    new_date = target_date - timedelta(days=3)
-                    monday = new_date - timedelta(days=new_date.weekday())
-                    for i in range(new_date.weekday() + 1):
-                        past_date = (monday + timedelta(days=i)).strftime('%Y-%m-%d')
-                        signal_file = os.path.join(signals_dir, f"d_{past_date}.json")
-                        if os.path.exists(signal_file):
-                            with open(signal_file, 'r', encoding='utf-8') as f:
-                                signal_data = json.load(f)
-                                text = signal_data["text"].strip()
-                                if text.startswith("```json"):
-                                    text = text[7:].rstrip("```").strip()
-                                signal_content = json.loads(text)
-                                signal_content["date"] = past_date
-                                prior_signals.append(signal_content)
-                    prompt = prompt.replace("[Prior Week's Signals]", json.dumps(prior_signals))
-                    prompt = prompt.replace("[Date]", date_input)
-                else:
-                    # Other weekdays: load all signals of the week so far
-                    monday = target_date - timedelta(days=target_date.weekday())
-                    for i in range(target_date.weekday() + 1):
-                        past_date = (monday + timedelta(days=i)).strftime('%Y-%m-%d')
-                        signal_file = os.path.join(signals_dir, f"d_{past_date}.json")
-                        if os.path.exists(signal_file):
-                            with open(signal_file, 'r', encoding='utf-8') as f:
-                                signal_data = json.load(f)
-                                text = signal_data["text"].strip()
-                                if text.startswith("```json"):
-                                    text = text[7:].rstrip("```").strip()
-                                signal_content = json.loads(text)
-                                signal_content["date"] = past_date
-                                prior_signals.append(signal_content)
-                    prompt = prompt.replace("[Prior Week's Signals]", json.dumps(prior_signals))
-                    prompt = prompt.replace("[Date]", date_input)
-
-    except ValueError as e:
-        raise ValueError(f"Invalid date format: {e}")
-
-    return prompt
+        substitutions["Portfolio String"] = portfolio_str
+
+    if prompt_type == 't':
+        past_dates = [(target_date - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(5)]
+
+        # Include stock data for the past 5 days
+        if "Stock Data" in placeholders:
+            # Each day is an independent CSV read; map keeps the date order
+            with ThreadPoolExecutor(max_workers=len(past_dates)) as ex:
+                stock_data = "\n".join(ex.map(_stock_data_or_fallback, past_dates)) + "\n"
+            substitutions["Stock Data"] = stock_data
+
+        # Include prior signals for the past 5 days
+        if "Prior Signals JSON" in placeholders:
+            prior_signals = _load_prior_signals(SIGNALS_DIR, past_dates)
+            substitutions["Prior Signals JSON"] = orjson.dumps(prior_signals).decode()
+        substitutions["Date"] = date_input
+
+    elif prompt_type == 'n':
+        # For no-trading-day: no stock data, just prior signals
+        if "Prior Signals JSON" in placeholders:
+            past_dates = [(target_date - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(5)]
+            prior_signals = _load_prior_signals(SIGNALS_DIR, past_dates)
+            substitutions["Prior Signals JSON"] = orjson.dumps(prior_signals).decode()
+        substitutions["Date"] = date_input
+
+    else:
+        # Daily or first-time prompt
+        if "Stock Data" in placeholders:
+            substitutions["Stock Data"] = _stock_data_or_fallback(date_input)
+
+        if prompt_type == 'd':
+            if "Prior Week's Signals" in placeholders:
+                # Monday looks back at the prior week (Monday-Friday);
+                # other weekdays load all signals of the week so far
+                anchor = target_date - timedelta(days=3) if target_date.weekday() == 0 else target_date
+                monday = anchor - timedelta(days=anchor.weekday())
+                week_dates = [(monday + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(anchor.weekday() + 1)]
+                prior_signals = _load_prior_signals(SIGNALS_DIR, week_dates)
+                substitutions["Prior Week's Signals"] = orjson.dumps(prior_signals).decode()
+            substitutions["Date"] = date_input
+
+    # Fill every placeholder in one pass; ones not set for this prompt type are left as-is
+    return _PLACEHOLDER.sub(lambda m: substitutions.get(m.group(1), m.group(0)), prompt)
 
 
 def is_weekday():
@@ -165,17 +190,9 @@ def is_weekday():
     return today.weekday() < 5
 
 
-def save_response(response, prompt_type: str, date_input: str):
-    """Saves Gemini response as JSON."""
-    base_dir = "Gemini Daily Reviews"
-    sub_dir = "Weekdays" if is_weekday() else "Weekends"
-    os.makedirs(os.path.join(base_dir, sub_dir), exist_ok=True)
-
-    date_str = datetime.strptime(date_input, '%Y-%m-%d').strftime('%Y-%m-%d')
-    filename = f"{prompt_type}_{date_str}.json"
-    filepath = os.path.join(base_dir, sub_dir, filename)
-
-    response_dict = {
+def response_to_dict(response) -> dict:
+    """Converts a Gemini response into the JSON structure stored on disk."""
+    return {
         "text": response.text,
         "model": "gemini-2.5-pro",
         "usage": {
@@ -184,38 +201,205 @@ def save_response(response, prompt_type: str, date_input: str):
         }
     }
 
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(response_dict, f, indent=2)
 
-    print(f"Response saved to: {filepath}")
+def _response_cache_path(prompt: str) -> str:
+    """Returns the cache file path for an exact prompt string."""
+    key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    return os.path.join(RESPONSE_CACHE_DIR, f"{key}.json")
 
 
-if __name__ == "__main__":
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+def load_cached_response(prompt: str):
+    """Returns the cached response dict for this prompt, or None if not cached."""
+    try:
+        with open(_response_cache_path(prompt), 'rb') as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+
+
+def cache_response(prompt: str, response_dict: dict):
+    """Stores a response dict under the prompt's hash, replacing the file atomically."""
+    os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+    filepath = _response_cache_path(prompt)
+    # A unique temp file per writer, so concurrent runs caching the same prompt don't collide
+    fd, tmp_path = tempfile.mkstemp(dir=RESPONSE_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(orjson.dumps(response_dict, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_response(response_dict: dict, prompt_type: str, target_date: datetime):
+    """Saves Gemini response as JSON."""
+    base_dir = "Gemini Daily Reviews"
+    sub_dir = "Weekdays" if is_weekday() else "Weekends"
+    os.makedirs(os.path.join(base_dir, sub_dir), exist_ok=True)
 
-    prompt_type = get_prompt_type()
+    date_str = target_date.strftime('%Y-%m-%d')
+    filename = f"{prompt_type}_{date_str}.json"
+    filepath = os.path.join(base_dir, sub_dir, filename)
+
+    with open(filepath, 'wb') as f:
+        f.write(orjson.dumps(response_dict, option=orjson.OPT_INDENT_2))
+
+    print(f"Response saved to: {filepath}")
 
-    date_input = input("Enter the date (YYYY-MM-DD): ").strip()
+
+def parse_date_input(date_input: str) -> datetime:
+    """Parses a YYYY-MM-DD date, warning when it falls on a weekend."""
     try:
         target_date = datetime.strptime(date_input, '%Y-%m-%d')
-        if target_date.weekday() >= 5:
-            print(f"Warning: {date_input} is a weekend. Consider using last trading day (e.g., 2025-09-24).")
     except ValueError:
-        print("Invalid date format. Please use YYYY-MM-DD (e.g., 2025-09-24).")
-        exit(1)
+        raise ValueError("Invalid date format. Please use YYYY-MM-DD (e.g., 2025-09-24).")
+    if target_date.weekday() >= 5:
+        print(f"Warning: {date_input} is a weekend. Consider using last trading day (e.g., 2025-09-24).")
+    return target_date
+
+
+def parse_run_args(args: list) -> list:
+    """Parses command-line runs given as PROMPT_TYPE:YYYY-MM-DD (e.g. d:2025-09-24)."""
+    runs = []
+    for arg in args:
+        prompt_type, _, date_input = arg.partition(':')
+        prompt_type = prompt_type.strip().lower()
+        if prompt_type not in ['f', 'd', 't', 'n'] or not date_input:
+            raise ValueError(f"Invalid run '{arg}'. Expected PROMPT_TYPE:YYYY-MM-DD with type f, d, t or n.")
+        runs.append((prompt_type, parse_date_input(date_input.strip())))
+    return runs
+
+
+async def run_prompt(model, prompt_type: str, target_date: datetime) -> bool:
+    """Builds one prompt, queries Gemini asynchronously and saves the response.
 
+    Failures are reported and turned into False, so one failing run never
+    cancels the others gathered alongside it.
+
+    Returns:
+        bool: True if a response was saved, False otherwise.
+    """
+    date_input = target_date.strftime('%Y-%m-%d')
     try:
-        prompt = load_prompt(prompt_type, date_input)
+        # Prompt building is blocking file I/O; run it off the event loop so runs overlap
+        prompt = await asyncio.to_thread(load_prompt, prompt_type, target_date)
     except (ValueError, FileNotFoundError) as e:
-        print(f"Error: {e}")
-        exit(1)
+        print(f"Error ({prompt_type}, {date_input}): {e}")
+        return False
 
     temperature = 0.3 if prompt_type in ['f', 'd'] else 0.35
 
-    model = genai.GenerativeModel("gemini-2.5-pro")
-    response = model.generate_content(prompt, generation_config={"temperature": temperature})
+    # Identical prompts give identical requests; SMSP_CACHE=1 reuses earlier responses
+    use_cache = os.getenv("SMSP_CACHE") == "1"
+    response_dict = load_cached_response(prompt) if use_cache else None
+    try:
+        if response_dict is None:
+            response = await model.generate_content_async(prompt, generation_config={"temperature": temperature})
+            response_dict = response_to_dict(response)
+            if use_cache:
+                try:
+                    cache_response(prompt, response_dict)
+                except OSError as e:
+                    # A cache miss next time is fine; losing this response is not
+                    print(f"Warning ({prompt_type}, {date_input}): could not cache response: {e}")
+        else:
+            print(f"Using cached Gemini response ({prompt_type}, {date_input}).")
+
+        print(f"Gemini Response ({prompt_type}, {date_input}):")
+        print(response_dict["text"])
+
+        save_response(response_dict, prompt_type, target_date)
+    except Exception as e:
+        print(f"Error ({prompt_type}, {date_input}): {e}")
+        return False
+    return True
 
-    print("Gemini Response:")
-    print(response.text)
 
-    save_response(response, prompt_type, date_input)
+def configure_genai():
+    """Imports and configures the Gemini client.
+
+    google.generativeai pulls in gRPC and protobuf, so it is only imported by the
+    code paths that actually call the API, not by importers of load_prompt.
+    """
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+def get_model():
+    """Returns the Gemini model used for all prompts."""
+    import google.generativeai as genai
+    return genai.GenerativeModel("gemini-2.5-pro")
+
+
+async def main(runs: list) -> bool:
+    """Runs all (prompt type, date) pairs concurrently; returns True if all succeeded.
+
+    Like batch_main, this assumes no run depends on another run's saved response.
+    """
+    model = get_model()
+    results = await asyncio.gather(*(run_prompt(model, prompt_type, target_date) for prompt_type, target_date in runs))
+    return all(results)
+
+
+def process_one(prompt_type: str, target_date: datetime) -> bool:
+    """Builds, sends and saves one prompt inside a batch worker process."""
+    model = get_model()
+    return asyncio.run(run_prompt(model, prompt_type, target_date))
+
+
+def batch_main(dates: list, prompt_type: str) -> bool:
+    """Runs one prompt type over many dates in a process pool; returns True if all succeeded.
+
+    The runs must be independent: daily prompts read the signals saved by earlier
+    days of the week, so consecutive 'd' dates should still be run one at a time.
+    """
+    # spawn rather than fork: the gRPC channels behind the Gemini client are not fork-safe
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(min(len(dates), os.cpu_count() or 1), initializer=configure_genai) as pool:
+        pending = [
+            pool.apply_async(process_one, (prompt_type, target_date), error_callback=print)
+            for target_date in dates
+        ]
+        results = []
+        for result in pending:
+            try:
+                results.append(result.get())
+            except Exception:
+                # Already reported by error_callback
+                results.append(False)
+    return all(results)
+
+
+if __name__ == "__main__":
+    # Spawned batch workers inherit the environment populated here
+    load_dotenv()
+    configure_genai()
+
+    # --batch PROMPT_TYPE DATE [DATE ...] fans one prompt type out over worker processes
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        try:
+            if len(sys.argv) < 4 or sys.argv[2].lower() not in ['f', 'd', 't', 'n']:
+                raise ValueError("Usage: send_prompt.py --batch PROMPT_TYPE YYYY-MM-DD [YYYY-MM-DD ...]")
+            batch_dates = [parse_date_input(date_input.strip()) for date_input in sys.argv[3:]]
+        except ValueError as e:
+            print(e)
+            exit(1)
+        if not batch_main(batch_dates, sys.argv[2].lower()):
+            exit(1)
+        exit(0)
+
+    # Either concurrent runs from the command line, or one run chosen interactively
+    try:
+        if len(sys.argv) > 1:
+            runs = parse_run_args(sys.argv[1:])
+        else:
+            prompt_type = get_prompt_type()
+            date_input = input("Enter the date (YYYY-MM-DD): ").strip()
+            runs = [(prompt_type, parse_date_input(date_input))]
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+    if not asyncio.run(main(runs)):
+        exit(1)